@@ -2,13 +2,100 @@
 
 #imports
 import google.generativeai as genai
-import os
-from typing import List, Dict, Optional
-import json, random
-from datetime import datetime, timedelta
+from google import genai as batch_genai
+import diskcache
+from flashtext2 import KeywordProcessor
+import os, tempfile, time, hashlib
+from typing import List, Dict, Optional, Tuple
+import orjson, random, re
+from email.utils import formatdate
+
+# gemini batch api settings
+BATCH_MODEL = 'gemini-pro'
+BATCH_POLL_SECONDS = 30
+BATCH_DONE_STATES = {'JOB_STATE_SUCCEEDED', 'JOB_STATE_FAILED', 'JOB_STATE_CANCELLED', 'JOB_STATE_EXPIRED'}
+
+# on-disk cache of ai summaries, keyed on contact + message ids
+CACHE_DIR = './.ai_cache'
+CACHE_TTL_SECONDS = 86400
+
+# keywords for the rule-based fallback summary, matched in a single aho-corasick pass
+SERVICE_KEYWORDS = ['website', 'dashboard', 'analytics', 'automation', 'ai', 'database', 'consulting',
+                    'development']
+_SERVICE_KP = KeywordProcessor(case_sensitive=False)
+_SERVICE_KP.add_keywords_from_iter(SERVICE_KEYWORDS)
+
+_SUBJECT_KP = KeywordProcessor(case_sensitive=False)
+_SUBJECT_KP.add_keywords_from_iter(['payment', 'inquiry'])
+
+# conversation bodies sent to gemini are whitespace-normalized and cut to this length
+MAX_BODY_CHARS = 300
+
+# cap on the per-contact conversation text (~6k tokens), older conversations are dropped past it
+MAX_PROMPT_CHARS = 24000
+TRUNCATED_MARKER = "[... older conversations truncated ...]\n"
+_RE_WHITESPACE = re.compile(r'\s+')
+
+# static summary instructions, keep this byte-stable so gemini can cache it
+# the per-contact conversation text is always sent after it as a separate part
+SUMMARY_SYSTEM_PROMPT = """analyze the email conversation history below and provide a structured summary.
+
+provide a json response with these fields:
+- last_contact_date: date of most recent interaction (yyyy-mm-dd format)
+- summary: brief summary of the relationship and recent interactions (2-3 sentences)
+- services_used: list the services or projects mentioned (comma separated)
+- next_action: suggested next step or follow-up action
+
+respond only with valid json, no other text.
+
+---
+CONVERSATION:
+"""
+
+# contacts summarized per gemini prompt in the batch paths
+PROMPT_BATCH_SIZE = 20
+
+# cap on the conversation text of one multi-contact prompt (~24k tokens, inside gemini-pro's context)
+# a group is cut early once the next contact would push it past this
+MAX_BATCH_PROMPT_CHARS = 4 * MAX_PROMPT_CHARS
+
+# static instructions for multi-contact prompts, same caching rules as above
+BATCH_SUMMARY_SYSTEM_PROMPT = """analyze the email conversation history of each contact below and provide a structured summary per contact.
+
+provide a json array with one object per contact, each with these fields:
+- contact_id: the contact_id given for that contact
+- last_contact_date: date of most recent interaction (yyyy-mm-dd format)
+- summary: brief summary of the relationship and recent interactions (2-3 sentences)
+- services_used: list the services or projects mentioned (comma separated)
+- next_action: suggested next step or follow-up action
+
+respond only with valid json, no other text.
+
+---
+CONTACTS:
+"""
 
 
 class AIProcessor:
+    # realistic conversation templates: subject, from, to, body, days ago range
+    _DUMMY_TEMPLATES = (
+        ("project update needed", "{email}", "me@company.com",
+         "hi, just wanted to check on the status of our website project. when can we expect the next deliverable? thanks, {name}",
+         (1, 30)),
+        ("re: project update needed", "me@company.com", "{email}",
+         "hi {name}, thanks for checking in. the design phase is complete and we're moving into development. expect the next update by friday.",
+         (1, 30)),
+        ("consulting services inquiry", "{email}", "me@company.com",
+         "i'm interested in your ai automation services for our customer support. can we schedule a call to discuss pricing and timeline? best, {name}",
+         (15, 60)),
+        ("follow up - analytics dashboard", "{email}", "me@company.com",
+         "the analytics dashboard you built is working great. we're seeing 30% improvement in our reporting efficiency. would like to discuss adding more features.",
+         (5, 45)),
+        ("payment processed", "me@company.com", "{email}",
+         "hi {name}, confirming we received your payment for the database optimization project. work will begin monday.",
+         (10, 40)),
+    )
+
     def __init__(self, api_key: str = None):
         """
         initialize ai processor with gemini
@@ -16,67 +103,33 @@ class AIProcessor:
         if api_key:
             genai.configure(api_key=api_key)
             self.model = genai.GenerativeModel('gemini-pro')
+            self.batch_client = batch_genai.Client(api_key=api_key)
+            self._cache = diskcache.Cache(CACHE_DIR)
         else:
             self.model = None
+            self.batch_client = None
+            self._cache = None
             print("warning: no gemini api key provided, using dummy mode")
 
     def generate_dummy_email_data(self, email: str, name: str) -> List[Dict]:
         """
         generate realistic dummy email conversations for demo
         """
-        #realistic conversation templates
-        templates = [
-            {
-                "subject": "project update needed",
-                "from": email,
-                "to": "me@company.com",
-                "body": f"hi, just wanted to check on the status of our website project. when can we expect the next deliverable? thanks, {name}",
-                "days_ago": random.randint(1, 30)
-            },
-            {
-                "subject": "re: project update needed",
-                "from": "me@company.com",
-                "to": email,
-                "body": f"hi {name}, thanks for checking in. the design phase is complete and we're moving into development. expect the next update by friday.",
-                "days_ago": random.randint(1, 30)
-            },
-            {
-                "subject": "consulting services inquiry",
-                "from": email,
-                "to": "me@company.com",
-                "body": f"i'm interested in your ai automation services for our customer support. can we schedule a call to discuss pricing and timeline? best, {name}",
-                "days_ago": random.randint(15, 60)
-            },
-            {
-                "subject": "follow up - analytics dashboard",
-                "from": email,
-                "to": "me@company.com",
-                "body": f"the analytics dashboard you built is working great. we're seeing 30% improvement in our reporting efficiency. would like to discuss adding more features.",
-                "days_ago": random.randint(5, 45)
-            },
-            {
-                "subject": "payment processed",
-                "from": "me@company.com",
-                "to": email,
-                "body": f"hi {name}, confirming we received your payment for the database optimization project. work will begin monday.",
-                "days_ago": random.randint(10, 40)
-            }
-        ]
-
         # randomly select 2-4 conversations
-        selected = random.sample(templates, random.randint(2, 4))
+        selected = random.sample(self._DUMMY_TEMPLATES, random.randint(2, 4))
+        now = time.time()
 
         conversations = []
-        for template in selected:
-            timestamp = datetime.now() - timedelta(days=template["days_ago"])
+        for subject, from_addr, to_addr, body, (min_days, max_days) in selected:
+            timestamp = now - random.randint(min_days, max_days) * 86400
             conversations.append({
                 'message_id': f"dummy_{random.randint(1000, 9999)}",
-                'subject': template["subject"],
-                'from': template["from"],
-                'to': template["to"],
-                'body': template["body"],
-                'timestamp': timestamp.timestamp(),
-                'date_str': timestamp.strftime('%a, %d %b %Y %H:%M:%S %z')
+                'subject': subject,
+                'from': from_addr.format(email=email),
+                'to': to_addr.format(email=email),
+                'body': body.format(name=name),
+                'timestamp': timestamp,
+                'date_str': formatdate(timestamp, localtime=True)
             })
 
         # sort by timestamp (newest first)
@@ -95,12 +148,18 @@ class AIProcessor:
                 'next_action': 'reach out to establish contact'
             }
 
+        # same contact with the same messages gives the same summary
+        cache_key = self._hash(contact_email, conversations)
+        cached = self._lookup(cache_key)
+        if cached:
+            return cached
+
         # prepare conversation text for ai
         conversation_text = self._format_conversations_for_ai(conversations, contact_name)
 
         if self.model:
             try:
-                return self._generate_ai_summary(conversation_text, contact_name, contact_email)
+                return self._generate_ai_summary(conversation_text, contact_name, contact_email, cache_key)
             except Exception as e:
                 print(f"ai summarization failed for {contact_email}: {e}")
                 return self._generate_fallback_summary(conversations, contact_name)
@@ -108,55 +167,264 @@ class AIProcessor:
             # fallback to rule-based summary
             return self._generate_fallback_summary(conversations, contact_name)
 
+    def summarize_many(self, contacts: List[Tuple[str, str, List[Dict]]], use_batch_api: bool = True) -> List[Dict]:
+        """
+        summarize many contacts with one gemini batch api job
+        contacts are (name, email, conversations) tuples, summaries come back in the same order
+        each prompt covers up to PROMPT_BATCH_SIZE contacts and MAX_BATCH_PROMPT_CHARS of conversation text
+        """
+        summaries = [None] * len(contacts)
+        cache_keys = {}
+        pending = []
+
+        for i, (name, email, conversations) in enumerate(contacts):
+            cache_key = self._hash(email, conversations)
+            cached = self._lookup(cache_key)
+            if cached:
+                summaries[i] = cached
+            elif conversations and self.model:
+                cache_keys[i] = cache_key
+                pending.append(i)
+            elif conversations:
+                # dummy mode
+                summaries[i] = self._generate_fallback_summary(conversations, name)
+            else:
+                # no history, nothing to summarize
+                summaries[i] = self.summarize_conversations(conversations, name, email)
+
+        # each conversation is formatted once, its length decides where groups are cut
+        texts = {i: self._format_conversations_for_ai(contacts[i][2], contacts[i][0]) for i in pending}
+        groups = self._group_for_prompts(pending, texts)
+        group_contents = [
+            self._build_batch_summary_contents([(contacts[i][1], texts[i]) for i in group])
+            for group in groups
+        ]
+
+        responses = {}
+        if groups and use_batch_api:
+            requests = {str(g): contents for g, contents in enumerate(group_contents)}
+            try:
+                responses = self._run_batch_job(requests)
+            except Exception as e:
+                print(f"batch summarization failed, falling back to direct requests: {e}")
+
+        for g, group in enumerate(groups):
+            try:
+                if str(g) in responses:
+                    group_summaries = self._parse_ai_batch_response(responses[str(g)])
+                else:
+                    # one direct gemini call for the whole group
+                    response = self.model.generate_content(group_contents[g])
+                    group_summaries = self._parse_ai_batch_response(response.text)
+            except Exception as e:
+                print(f"ai summarization failed for {len(group)} contacts: {e}")
+                group_summaries = {}
+
+            for contact_id, i in enumerate(group):
+                if contact_id in group_summaries:
+                    summaries[i] = group_summaries[contact_id]
+                    self._update(cache_keys[i], summaries[i])
+                else:
+                    name, _, conversations = contacts[i]
+                    summaries[i] = self._generate_fallback_summary(conversations, name)
+
+        return summaries
+
+    def summarize_conversations_batch(self, contacts: List[Tuple[str, str, List[Dict]]]) -> List[Dict]:
+        """
+        summarize contacts with direct gemini calls, one call per PROMPT_BATCH_SIZE contacts
+        same as summarize_many without waiting on a batch api job
+        """
+        return self.summarize_many(contacts, use_batch_api=False)
+
+    def _run_batch_job(self, requests: Dict[str, List[str]]) -> Dict[str, str]:
+        """
+        submit prompt parts as a jsonl batch job, wait for it and return response text by key
+        """
+        with tempfile.NamedTemporaryFile('wb', suffix='.jsonl', delete=False) as f:
+            for key, parts in requests.items():
+                line = {"key": key, "request": {"contents": [{"parts": [{"text": part} for part in parts]}]}}
+                f.write(orjson.dumps(line) + b"\n")
+            jsonl_path = f.name
+
+        try:
+            uploaded = self.batch_client.files.upload(
+                file=jsonl_path, config={'display_name': 'contact-summaries', 'mime_type': 'jsonl'})
+        finally:
+            os.remove(jsonl_path)
+
+        batch_job = self.batch_client.batches.create(model=BATCH_MODEL, src=uploaded.name)
+
+        # poll until the job reaches a terminal state
+        while batch_job.state.name not in BATCH_DONE_STATES:
+            time.sleep(BATCH_POLL_SECONDS)
+            batch_job = self.batch_client.batches.get(name=batch_job.name)
+
+        if batch_job.state.name != 'JOB_STATE_SUCCEEDED':
+            raise Exception(f"batch job {batch_job.name} ended in state {batch_job.state.name}")
+
+        content = self.batch_client.files.download(file=batch_job.dest.file_name)
+
+        responses = {}
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            item = orjson.loads(line)
+            try:
+                responses[item['key']] = item['response']['candidates'][0]['content']['parts'][0]['text']
+            except (KeyError, IndexError):
+                # failed request, caller falls back for this key
+                print(f"batch request {item.get('key')} returned no text: {item.get('error')}")
+
+        return responses
+
+    def _hash(self, contact_email: str, conversations: List[Dict]) -> str:
+        """
+        cache key for a contact's conversation set
+        new messages change the id set, so stale summaries are never hit
+        """
+        message_ids = sorted(conv['message_id'] for conv in conversations)
+        return hashlib.md5((contact_email + "|" + "|".join(message_ids)).encode()).hexdigest()
+
+    def _lookup(self, cache_key: str) -> Optional[Dict]:
+        """
+        return cached summary for key, if any
+        """
+        if self._cache is None:
+            return None
+        return self._cache.get(cache_key)
+
+    def _update(self, cache_key: Optional[str], summary_data: Dict):
+        """
+        store an ai summary, rule-based fallbacks are never cached
+        """
+        if self._cache is None or cache_key is None:
+            return
+        self._cache.set(cache_key, summary_data, expire=CACHE_TTL_SECONDS)
+
     def _format_conversations_for_ai(self, conversations: List[Dict], contact_name: str) -> str:
         """
         format conversations for ai processing
         """
         text = f"email conversation history with {contact_name}:\n\n"
 
-        for conv in conversations:
-            date = datetime.fromtimestamp(conv['timestamp']).strftime('%y-%m-%d')
+        # newest first, message id breaks timestamp ties so reruns give byte-identical text
+        ordered = sorted(conversations, key=lambda conv: (-conv['timestamp'], conv['message_id']))
+
+        for conv in ordered:
+            date = self._format_date(conv['timestamp'], short_year=True)
             direction = "from client" if conv['from'] != "me@company.com" else "to client"
-            text += f"[{date}] ({direction}) subject: {conv['subject']}\n"
-            text += f"message: {conv['body'][:300]}...\n\n"
+            body = _RE_WHITESPACE.sub(' ', conv['body']).strip()
+            if len(body) > MAX_BODY_CHARS:
+                body = body[:MAX_BODY_CHARS] + "..."
+            entry = f"[{date}] ({direction}) subject: {conv['subject']}\nmessage: {body}\n\n"
+
+            # keep the newest conversations that fit the budget
+            if len(text) + len(entry) > MAX_PROMPT_CHARS:
+                text += TRUNCATED_MARKER
+                break
+            text += entry
 
         return text
 
-    def _generate_ai_summary(self, conversation_text: str, contact_name: str, contact_email: str) -> Dict:
+    def _format_date(self, timestamp: float, short_year: bool = False) -> str:
         """
-        generate ai summary using gemini
+        local yyyy-mm-dd (or yy-mm-dd) date for a timestamp, without building a datetime
         """
-        prompt = f"""
-analyze this email conversation history and provide a structured summary:
+        tm = time.localtime(timestamp)
+        year = tm.tm_year % 100 if short_year else tm.tm_year
+        return f"{year:02d}-{tm.tm_mon:02d}-{tm.tm_mday:02d}"
 
-{conversation_text}
+    def _build_summary_contents(self, conversation_text: str) -> List[str]:
+        """
+        build the gemini request parts for a single contact
+        static instructions go first so every request shares a cacheable prefix
+        """
+        return [SUMMARY_SYSTEM_PROMPT, conversation_text]
 
-provide a json response with these fields:
-- last_contact_date: date of most recent interaction (yyyy-mm-dd format)
-- summary: brief summary of the relationship and recent interactions (2-3 sentences)
-- services_used: list the services or projects mentioned (comma separated)
-- next_action: suggested next step or follow-up action
+    def _group_for_prompts(self, pending: List[int], texts: Dict[int, str]) -> List[List[int]]:
+        """
+        split contact indexes into prompt groups, bounded by contact count and total conversation text
+        """
+        groups = []
+        group, group_chars = [], 0
+        for i in pending:
+            if group and (len(group) >= PROMPT_BATCH_SIZE or group_chars + len(texts[i]) > MAX_BATCH_PROMPT_CHARS):
+                groups.append(group)
+                group, group_chars = [], 0
+            group.append(i)
+            group_chars += len(texts[i])
+
+        if group:
+            groups.append(group)
+        return groups
+
+    def _build_batch_summary_contents(self, contacts: List[Tuple[str, str]]) -> List[str]:
+        """
+        build the gemini request parts for several (email, conversation text) contacts in one prompt
+        contacts are numbered from 0 so the response array can be matched back
+        """
+        blocks = []
+        for contact_id, (email, conversation_text) in enumerate(contacts):
+            blocks.append(f"contact_id: {contact_id}\nemail: {email}\n{conversation_text}")
 
-respond only with valid json, no other text.
-"""
+        return [BATCH_SUMMARY_SYSTEM_PROMPT, "---\n".join(blocks)]
 
-        try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
+    def _load_ai_json(self, result_text: str):
+        """
+        parse gemini json output, tolerating a markdown code fence
+        """
+        result_text = result_text.strip()
+
+        # clean up response - remove markdown if present
+        if result_text.startswith('```json'):
+            result_text = result_text.replace('```json', '').replace('```', '').strip()
+
+        return orjson.loads(result_text)
+
+    def _parse_ai_batch_response(self, result_text: str) -> Dict[int, Dict]:
+        """
+        parse a multi-contact gemini response into summaries by contact_id
+        """
+        summaries = {}
+        for item in self._load_ai_json(result_text):
+            # gemini sometimes echoes the id back as a string
+            try:
+                contact_id = int(item.pop('contact_id', None))
+            except (TypeError, ValueError):
+                continue
+            summaries[contact_id] = self._validate_summary(item)
+
+        return summaries
+
+    def _parse_ai_response(self, result_text: str) -> Dict:
+        """
+        parse gemini json response into a summary dict
+        """
+        return self._validate_summary(self._load_ai_json(result_text))
 
-            # clean up response - remove markdown if present
-            if result_text.startswith('```json'):
-                result_text = result_text.replace('```json', '').replace('```', '').strip()
+    def _validate_summary(self, summary_data: Dict) -> Dict:
+        """
+        make sure a parsed summary has every required field
+        """
+        required_fields = ['last_contact_date', 'summary', 'services_used', 'next_action']
+        for field in required_fields:
+            if field not in summary_data:
+                summary_data[field] = 'not specified'
 
-            # parse json response
-            summary_data = json.loads(result_text)
+        return summary_data
 
-            # validate required fields
-            required_fields = ['last_contact_date', 'summary', 'services_used', 'next_action']
-            for field in required_fields:
-                if field not in summary_data:
-                    summary_data[field] = 'not specified'
+    def _generate_ai_summary(self, conversation_text: str, contact_name: str, contact_email: str,
+                             cache_key: str = None) -> Dict:
+        """
+        generate ai summary using gemini
+        """
+        contents = self._build_summary_contents(conversation_text)
 
+        try:
+            response = self.model.generate_content(contents)
+            summary_data = self._parse_ai_response(response.text)
+            self._update(cache_key, summary_data)
             return summary_data
 
         except Exception as e:
@@ -168,30 +436,25 @@ respond only with valid json, no other text.
         """
         generate rule-based summary when ai fails
         """
-        last_contact = datetime.fromtimestamp(conversations[0]['timestamp'])
+        last_contact = self._format_date(conversations[0]['timestamp'])
 
-        # extract services mentioned
-        services = []
+        # extract services mentioned, kept in keyword list order
         all_text = " ".join([conv['body'] + " " + conv['subject'] for conv in conversations])
-        service_keywords = ['website', 'dashboard', 'analytics', 'automation', 'ai', 'database', 'consulting',
-                            'development']
-
-        for keyword in service_keywords:
-            if keyword in all_text.lower():
-                services.append(keyword)
+        found = set(_SERVICE_KP.extract_keywords(all_text))
+        services = [keyword for keyword in SERVICE_KEYWORDS if keyword in found]
 
         # generate summary based on patterns
-        recent_subjects = [conv['subject'] for conv in conversations[:3]]
+        subject_keywords = set(_SUBJECT_KP.extract_keywords(" | ".join(conv['subject'] for conv in conversations[:3])))
 
-        if any('payment' in subject.lower() for subject in recent_subjects):
+        if 'payment' in subject_keywords:
             summary = f"active client relationship with {contact_name}. recent payment processed, project in progress."
-        elif any('inquiry' in subject.lower() for subject in recent_subjects):
+        elif 'inquiry' in subject_keywords:
             summary = f"potential client {contact_name} has made service inquiries. opportunity for new business."
         else:
             summary = f"ongoing communication with {contact_name}. project updates and collaboration."
 
         return {
-            'last_contact_date': last_contact.strftime('%Y-%m-%d'),
+            'last_contact_date': last_contact,
             'summary': summary,
             'services_used': ', '.join(services) if services else 'general consulting',
             'next_action': 'follow up on current project status'
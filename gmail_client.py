@@ -8,12 +8,35 @@ from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 import re
 from email.mime.text import MIMEText
+from email.utils import parsedate_tz, mktime_tz
 
 # gmail api scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+# timeout for gmail http calls, in seconds
+HTTP_TIMEOUT = 30
+
+# messages per batch http request, larger batches trip gmail's concurrent request limits
+BATCH_SIZE = 50
+
+# headers _parse_message reads, used for metadata-only fetches
+METADATA_HEADERS = ['Subject', 'From', 'To', 'Date']
+
+# partial response masks, only the fields _parse_message reads are sent back
+LIST_FIELDS = 'messages/id,nextPageToken'
+MESSAGE_FIELDS = 'id,payload(headers(name,value),mimeType,body/data,parts(mimeType,body/data))'
+METADATA_FIELDS = 'id,payload(headers(name,value),mimeType)'
+
+# email body cleanup patterns, compiled once and run on the raw utf-8 bytes
+_RE_NEWLINES = re.compile(rb'\n{3,}')
+_RE_SPACES = re.compile(rb' {2,}')
+# reply quote markers and from/sent/to/subject header lines in one pass
+_RE_ARTIFACTS = re.compile(rb'On .* wrote:|(?:From|Sent|To|Subject): .*')
+
 
 class GmailClient:
     def __init__(self):
@@ -52,7 +75,7 @@ class GmailClient:
                 pickle.dump(creds, token)
 
         self.credentials = creds
-        self.service = build('gmail', 'v1', credentials=creds)
+        self.service = self._build_service(creds)
         return None
 
     def complete_auth(self, authorization_code: str, credentials_file: str = "credentials.json"):
@@ -71,16 +94,61 @@ class GmailClient:
             pickle.dump(creds, token)
 
         self.credentials = creds
-        self.service = build('gmail', 'v1', credentials=creds)
+        self.service = self._build_service(creds)
 
-    def search_conversations(self, email_address: str, months_back: int = 6) -> List[Dict]:
+    def _build_service(self, creds: Credentials):
+        """
+        build the gmail service once per client and reuse it for every request
+        uses the discovery doc bundled with googleapiclient, so no discovery http call,
+        and one authorized http connection that is kept alive between calls
+        """
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        return build('gmail', 'v1', http=http, static_discovery=True, cache_discovery=False)
+
+    def search_conversations(self, email_address: str, months_back: int = 6, include_body: bool = True) -> List[Dict]:
         """
         search for email conversations with specific contact
         returns list of email data
+        set include_body=False to fetch headers only
+        """
+        return self.search_conversations_many([email_address], months_back, include_body)[email_address]
+
+    def search_conversations_many(self, email_addresses: List[str], months_back: int = 6,
+                                  include_body: bool = True) -> Dict[str, List[Dict]]:
+        """
+        search conversations for several contacts at once
+        message ids are listed per contact, then all messages are fetched through shared batch requests
+        returns email data lists keyed by contact email
         """
         if not self.service:
             raise Exception("not authenticated with gmail")
 
+        message_ids = {}
+        for email_address in email_addresses:
+            try:
+                message_ids[email_address] = self._list_message_ids(email_address, months_back)
+            except Exception as e:
+                print(f"error searching conversations for {email_address}: {e}")
+                message_ids[email_address] = []
+
+        # a message can involve more than one contact, fetch it once
+        unique_ids = list(dict.fromkeys(msg_id for ids in message_ids.values() for msg_id in ids))
+        messages = self.batch_get_messages(unique_ids, include_body)
+
+        conversations = {}
+        for email_address, ids in message_ids.items():
+            contact_conversations = [messages[msg_id] for msg_id in ids if msg_id in messages]
+
+            # sort by date (newest first)
+            contact_conversations.sort(key=lambda x: x['timestamp'], reverse=True)
+            conversations[email_address] = contact_conversations
+
+        return conversations
+
+    def _list_message_ids(self, email_address: str, months_back: int) -> List[str]:
+        """
+        list ids of messages to/from a contact
+        """
         # calculate date range
         since_date = datetime.now() - timedelta(days=months_back * 30)
         since_str = since_date.strftime("%Y/%m/%d")
@@ -88,35 +156,43 @@ class GmailClient:
         # search query for emails to/from this contact
         query = f"(from:{email_address} OR to:{email_address}) after:{since_str}"
 
-        try:
-            # get message list
-            result = self.service.users().messages().list(
-                userId='me', q=query, maxResults=50).execute()
-
-            messages = result.get('messages', [])
-
-            conversations = []
-            for msg in messages:
-                try:
-                    # get full message details
-                    message = self.service.users().messages().get(
-                        userId='me', id=msg['id']).execute()
+        result = self.service.users().messages().list(
+            userId='me', q=query, maxResults=50, fields=LIST_FIELDS).execute()
 
-                    email_data = self._parse_message(message)
-                    if email_data:
-                        conversations.append(email_data)
+        return [msg['id'] for msg in result.get('messages', [])]
 
-                except Exception as e:
-                    print(f"error parsing message {msg['id']}: {e}")
-                    continue
-
-            # sort by date (newest first)
-            conversations.sort(key=lambda x: x['timestamp'], reverse=True)
-            return conversations
-
-        except Exception as e:
-            print(f"error searching conversations for {email_address}: {e}")
-            return []
+    def batch_get_messages(self, message_ids: List[str], include_body: bool = False) -> Dict[str, Dict]:
+        """
+        fetch messages through gmail batch http requests, up to BATCH_SIZE per request
+        returns parsed email data keyed by message id, failed messages are skipped
+        """
+        if include_body:
+            get_kwargs = {'format': 'full', 'fields': MESSAGE_FIELDS}
+        else:
+            get_kwargs = {'format': 'metadata', 'metadataHeaders': METADATA_HEADERS, 'fields': METADATA_FIELDS}
+
+        parsed = {}
+
+        def _on_message(request_id, response, exception):
+            if exception is not None:
+                print(f"error fetching message {request_id}: {exception}")
+                return
+            email_data = self._parse_message(response)
+            if email_data:
+                parsed[request_id] = email_data
+
+        for start in range(0, len(message_ids), BATCH_SIZE):
+            batch = self.service.new_batch_http_request()
+            for msg_id in message_ids[start:start + BATCH_SIZE]:
+                batch.add(
+                    self.service.users().messages().get(userId='me', id=msg_id, **get_kwargs),
+                    callback=_on_message, request_id=msg_id)
+            try:
+                batch.execute()
+            except Exception as e:
+                print(f"error executing gmail batch request: {e}")
+
+        return parsed
 
     def _parse_message(self, message: Dict) -> Optional[Dict]:
         """
@@ -124,24 +200,13 @@ class GmailClient:
         """
         try:
             payload = message['payload']
-            headers = payload.get('headers', [])
-
-            # extract headers
-            subject = ""
-            from_email = ""
-            to_email = ""
-            date_str = ""
-
-            for header in headers:
-                name = header['name'].lower()
-                if name == 'subject':
-                    subject = header['value']
-                elif name == 'from':
-                    from_email = header['value']
-                elif name == 'to':
-                    to_email = header['value']
-                elif name == 'date':
-                    date_str = header['value']
+
+            # extract headers, keyed case-insensitively
+            headers = {header['name'].lower(): header['value'] for header in payload.get('headers', [])}
+            subject = headers.get('subject', '')
+            from_email = headers.get('from', '')
+            to_email = headers.get('to', '')
+            date_str = headers.get('date', '')
 
             # extract body
             body = self._extract_body(payload)
@@ -167,54 +232,48 @@ class GmailClient:
         """
         extract text body from email payload
         """
-        body = ""
-
         if 'parts' in payload:
-            # multipart message
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    data = part['body'].get('data', '')
-                    if data:
-                        body = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-                        break
+            # multipart message, first text/plain part with data wins
+            part = next((part for part in payload['parts']
+                         if part.get('mimeType') == 'text/plain' and part.get('body', {}).get('data')), None)
+            data = part['body']['data'] if part else ''
+        elif payload.get('mimeType') == 'text/plain':
+            # single part message, metadata-only fetches carry no body
+            data = payload.get('body', {}).get('data', '')
         else:
-            # single part message
-            if payload['mimeType'] == 'text/plain':
-                data = payload['body'].get('data', '')
-                if data:
-                    body = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
+            data = ''
+
+        if not data:
+            return ""
 
-        # clean up body text
-        body = self._clean_email_body(body)
-        return body
+        # clean up body text before decoding
+        return self._clean_email_body(base64.urlsafe_b64decode(data))
 
-    def _clean_email_body(self, body: str) -> str:
+    def _clean_email_body(self, body: bytes) -> str:
         """
-        clean email body text
+        clean raw email body bytes and decode to text
         """
         # remove excessive whitespace
-        body = re.sub(r'\n{3,}', '\n\n', body)
-        body = re.sub(r' {2,}', ' ', body)
+        body = _RE_NEWLINES.sub(b'\n\n', body)
+        body = _RE_SPACES.sub(b' ', body)
 
         # remove common email artifacts
-        body = re.sub(r'On .* wrote:', '', body)
-        body = re.sub(r'From: .*', '', body)
-        body = re.sub(r'Sent: .*', '', body)
-        body = re.sub(r'To: .*', '', body)
-        body = re.sub(r'Subject: .*', '', body)
+        body = _RE_ARTIFACTS.sub(b'', body)
 
-        return body.strip()
+        return body.decode('utf-8', errors='ignore').strip()
 
     def _parse_date(self, date_str: str) -> float:
         """
         parse email date string to timestamp
         """
+        # gmail dates are in rfc2822 format, parse straight to a timestamp
+        parsed = parsedate_tz(date_str)
+        if not parsed:
+            return 0.0
+
         try:
-            # gmail dates are in rfc2822 format
-            from email.utils import parsedate_to_datetime
-            dt = parsedate_to_datetime(date_str)
-            return dt.timestamp()
-        except Exception:
+            return float(mktime_tz(parsed))
+        except (OverflowError, ValueError):
             return 0.0
 
     def get_recent_conversations_summary(self, email_address: str) -> Dict:
@@ -0,0 +1,195 @@
+# 541
+
+# imports
+import asyncio, orjson
+from typing import List, Dict, Optional, AsyncIterator
+import redis.asyncio as redis
+from cachetools import TTLCache
+
+# seconds a job and its results are kept after the last update
+# a day, gemini batch jobs can run well past an hour
+JOB_TTL_SECONDS = 86400
+
+# most jobs the in-memory store keeps at once, the oldest are dropped first
+MEMORY_MAX_JOBS = 1000
+
+
+class RedisJobStore:
+    def __init__(self, redis_url: str):
+        """
+        job state shared across uvicorn workers through redis
+        jobs are hashes under job:{id}, results are json under results:{id}
+        csv:{digest} points an uploaded file's content hash at the job that processed it
+        contacts:{id} holds a job's parsed upload until a celery worker picks it up
+        every job change is announced on the job-events:{id} channel
+        """
+        self.redis = redis.from_url(redis_url, decode_responses=True)
+        # parsed uploads are binary feather files, read without decoding
+        self.raw_redis = redis.from_url(redis_url)
+
+    async def create_job(self, job_id: str, job: Dict):
+        await self.update_job(job_id, **job)
+
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        data = await self.redis.hgetall(f"job:{job_id}")
+        if not data:
+            return None
+        # hash values are json encoded so ints and none survive the round trip
+        return {field: orjson.loads(value) for field, value in data.items()}
+
+    async def update_job(self, job_id: str, **fields):
+        key = f"job:{job_id}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={field: orjson.dumps(value) for field, value in fields.items()})
+            pipe.expire(key, JOB_TTL_SECONDS)
+            pipe.publish(f"job-events:{job_id}", "update")
+            await pipe.execute()
+
+    async def increment_progress(self, job_id: str, amount: int = 1):
+        # atomic on the redis side, safe across concurrent tasks and workers
+        await self.redis.hincrby(f"job:{job_id}", "progress", amount)
+        await self.redis.publish(f"job-events:{job_id}", "update")
+
+    async def remember_upload(self, digest: str, job_id: str):
+        await self.redis.set(f"csv:{digest}", job_id, ex=JOB_TTL_SECONDS)
+
+    async def find_upload(self, digest: str) -> Optional[str]:
+        return await self.redis.get(f"csv:{digest}")
+
+    async def set_contacts(self, job_id: str, data: bytes):
+        await self.raw_redis.set(f"contacts:{job_id}", data, ex=JOB_TTL_SECONDS)
+
+    async def get_contacts(self, job_id: str) -> Optional[bytes]:
+        return await self.raw_redis.get(f"contacts:{job_id}")
+
+    async def delete_contacts(self, job_id: str):
+        await self.raw_redis.delete(f"contacts:{job_id}")
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[Dict]:
+        """
+        yield the current job state, then the new state after every change
+        """
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(f"job-events:{job_id}")
+        try:
+            # subscribed before the first read, so no update in between is missed
+            yield await self.get_job(job_id)
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    yield await self.get_job(job_id)
+        finally:
+            await pubsub.aclose()
+
+    async def close(self):
+        # drops pooled connections, new ones are opened on next use
+        await self.redis.aclose()
+        await self.raw_redis.aclose()
+
+    async def set_results(self, job_id: str, results: List[Dict]):
+        await self.redis.set(f"results:{job_id}", orjson.dumps(results), ex=JOB_TTL_SECONDS)
+
+    async def get_results(self, job_id: str) -> Optional[List[Dict]]:
+        data = await self.redis.get(f"results:{job_id}")
+        if data is None:
+            return None
+        return orjson.loads(data)
+
+    async def get_results_json(self, job_id: str) -> Optional[str]:
+        """
+        results exactly as stored, lets the api skip a decode/encode round trip
+        """
+        return await self.redis.get(f"results:{job_id}")
+
+
+class MemoryJobStore:
+    def __init__(self):
+        """
+        in-process job state for local runs, only works with a single worker
+        entries expire like the redis keys do, and the store never holds more than MEMORY_MAX_JOBS jobs
+        """
+        self.jobs = TTLCache(maxsize=MEMORY_MAX_JOBS, ttl=JOB_TTL_SECONDS)
+        self.results = TTLCache(maxsize=MEMORY_MAX_JOBS, ttl=JOB_TTL_SECONDS)
+        self.uploads = TTLCache(maxsize=MEMORY_MAX_JOBS, ttl=JOB_TTL_SECONDS)
+        self.contacts = TTLCache(maxsize=MEMORY_MAX_JOBS, ttl=JOB_TTL_SECONDS)
+        self.listeners = {}
+
+    def _notify(self, job_id: str):
+        for queue in self.listeners.get(job_id, ()):
+            queue.put_nowait(dict(self.jobs[job_id]))
+
+    async def create_job(self, job_id: str, job: Dict):
+        self.jobs[job_id] = dict(job)
+        self._notify(job_id)
+
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        job = self.jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def update_job(self, job_id: str, **fields):
+        # only create_job inserts, a job evicted from the cache mid-run is not brought back half-filled
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        # reassigning restarts the entry's ttl, same as the expire in the redis store
+        self.jobs[job_id] = job
+        self._notify(job_id)
+
+    async def increment_progress(self, job_id: str, amount: int = 1):
+        # a job evicted from the cache mid-run has nothing left to count
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        job["progress"] += amount
+        self._notify(job_id)
+
+    async def remember_upload(self, digest: str, job_id: str):
+        self.uploads[digest] = job_id
+
+    async def find_upload(self, digest: str) -> Optional[str]:
+        return self.uploads.get(digest)
+
+    async def set_contacts(self, job_id: str, data: bytes):
+        self.contacts[job_id] = data
+
+    async def get_contacts(self, job_id: str) -> Optional[bytes]:
+        return self.contacts.get(job_id)
+
+    async def delete_contacts(self, job_id: str):
+        self.contacts.pop(job_id, None)
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[Dict]:
+        queue = asyncio.Queue()
+        self.listeners.setdefault(job_id, set()).add(queue)
+        try:
+            yield await self.get_job(job_id)
+            while True:
+                yield await queue.get()
+        finally:
+            self.listeners[job_id].discard(queue)
+            if not self.listeners[job_id]:
+                del self.listeners[job_id]
+
+    async def close(self):
+        pass
+
+    async def set_results(self, job_id: str, results: List[Dict]):
+        self.results[job_id] = results
+
+    async def get_results(self, job_id: str) -> Optional[List[Dict]]:
+        return self.results.get(job_id)
+
+    async def get_results_json(self, job_id: str) -> Optional[bytes]:
+        results = self.results.get(job_id)
+        return orjson.dumps(results) if results is not None else None
+
+
+def create_job_store(redis_url: str = None):
+    """
+    use redis when configured, otherwise keep jobs in memory
+    """
+    if redis_url:
+        return RedisJobStore(redis_url)
+
+    print("warning: no redis url provided, keeping jobs in memory")
+    return MemoryJobStore()
@@ -2,163 +2,58 @@
 
 # imports
 from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Request
-from fastapi.responses import HTMLResponse, JSONResponse, Response, RedirectResponse
-import pandas as pd
-import os, uuid, json
-from typing import List, Dict
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
+import pyarrow as pa
+import pyarrow.csv as pv
+import os, uuid, asyncio, csv, io, orjson, hashlib, time
+from typing import List, Dict, Iterator, Tuple
 from datetime import datetime
 from dotenv import load_dotenv
 from ai_processor import AIProcessor
+from job_store import create_job_store
+from tasks import CELERY_ENABLED, process_contacts_task
 
 load_dotenv()
 
-app = FastAPI(title="AI Contact Automation", version="1.0.0")
+app = FastAPI(title="AI Contact Automation", version="1.0.0", default_response_class=ORJSONResponse)
 
-# in-memory storage for demo
-jobs = {}
-results = {}
+# job state lives in redis when REDIS_URL is set, in memory otherwise
+job_store = create_job_store(os.getenv('REDIS_URL'))
 ai_processor = AIProcessor(api_key=os.getenv('GEMINI_API_KEY'))
 
+# max contacts fetched at once
+MAX_CONCURRENT_CONTACTS = 10
 
-@app.get("/", response_class=HTMLResponse)
+# contacts read and fetched per batch, summaries are done for the whole upload at once
+CONTACT_CHUNK_SIZE = 500
+
+# block size for hashing uploads
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+# columns an uploaded csv must have, matched case insensitively
+REQUIRED_COLUMNS = ('name', 'email')
+
+# columns of the feather file handed from /upload to process_contacts, already normalized
+CONTACT_SCHEMA = pa.schema([(col, pa.string()) for col in REQUIRED_COLUMNS])
+
+# csv export is streamed in blocks of roughly this many characters
+EXPORT_FLUSH_CHARS = 64 * 1024
+
+# columns of a contact result record, in export order
+RESULT_FIELDS = ["name", "email", "last_contact_date", "summary", "services_used", "next_action"]
+
+# job fields stored as unix timestamps, shown as iso dates
+JOB_TIME_FIELDS = ("started_at", "completed_at")
+
+# homepage, served from disk with a short browser cache
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "index.html")
+HOME_CACHE_CONTROL = "public, max-age=300"
+
+
+@app.get("/")
 async def home():
-    return """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>AI Contact Automation</title>
-        <style>
-            body { font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }
-            .upload-area { border: 2px dashed #ccc; padding: 40px; text-align: center; margin: 20px 0; }
-            .status { padding: 10px; margin: 10px 0; border-radius: 5px; }
-            .processing { background: #fff3cd; color: #856404; }
-            .complete { background: #d4edda; color: #155724; }
-            .error { background: #f8d7da; color: #721c24; }
-            .info { background: #e3f2fd; color: #1565c0; }
-            button { padding: 10px 20px; background: #007bff; color: white; border: none; border-radius: 5px; cursor: pointer; margin: 5px; }
-            button:hover { background: #0056b3; }
-            table { width: 100%; border-collapse: collapse; margin-top: 20px; }
-            th, td { padding: 12px; text-align: left; border-bottom: 1px solid #ddd; }
-            th { background-color: #f8f9fa; }
-            .demo-note { background: #ffeaa7; padding: 15px; border-radius: 5px; margin: 20px 0; }
-        </style>
-    </head>
-    <body>
-        <h1>AI Contact Automation Tool</h1>
-        <p>Upload a CSV with contact names and emails to get AI-powered summaries of your interactions.</p>
-
-        <div class="demo-note">
-            <strong>demo mode:</strong> using realistic dummy email data. real gmail integration coming soon!
-        </div>
-
-        <div class="upload-area">
-            <form id="uploadForm" enctype="multipart/form-data">
-                <input type="file" id="csvFile" accept=".csv" required>
-                <br><br>
-                <button type="submit">upload & process</button>
-            </form>
-        </div>
-
-        <div id="status" style="display: none;"></div>
-        <div id="results" style="display: none;"></div>
-
-        <script>
-            let currentJobId = null;
-
-            document.getElementById('uploadForm').addEventListener('submit', async (e) => {
-                e.preventDefault();
-                const formData = new FormData();
-                const fileInput = document.getElementById('csvFile');
-                formData.append('file', fileInput.files[0]);
-
-                try {
-                    const response = await fetch('/upload', {
-                        method: 'POST',
-                        body: formData
-                    });
-                    const data = await response.json();
-
-                    if (response.ok) {
-                        currentJobId = data.job_id;
-                        showStatus('processing started...', 'processing');
-                        checkProgress();
-                    } else {
-                        showStatus(data.detail, 'error');
-                    }
-                } catch (error) {
-                    showStatus('upload failed: ' + error.message, 'error');
-                }
-            });
-
-            function showStatus(message, type) {
-                const statusDiv = document.getElementById('status');
-                statusDiv.innerHTML = `<div class="status ${type}">${message}</div>`;
-                statusDiv.style.display = 'block';
-            }
-
-            async function checkProgress() {
-                if (!currentJobId) return;
-
-                try {
-                    const response = await fetch(`/status/${currentJobId}`);
-                    const data = await response.json();
-
-                    if (data.status === 'processing') {
-                        showStatus(`processing... ${data.progress}/${data.total} contacts completed`, 'processing');
-                        setTimeout(checkProgress, 2000);
-                    } else if (data.status === 'complete') {
-                        showStatus('processing complete!', 'complete');
-                        loadResults();
-                    } else if (data.status === 'error') {
-                        showStatus('error: ' + data.error, 'error');
-                    }
-                } catch (error) {
-                    showStatus('status check failed: ' + error.message, 'error');
-                }
-            }
-
-            async function loadResults() {
-                if (!currentJobId) return;
-
-                try {
-                    const response = await fetch(`/results/${currentJobId}`);
-                    const data = await response.json();
-
-                    let html = '<h2>contact analysis results</h2>';
-                    html += '<button onclick="exportResults()">export csv</button>';
-                    html += '<table><tr><th>name</th><th>email</th><th>last contact</th><th>summary</th><th>services used</th><th>next action</th></tr>';
-
-                    data.results.forEach(result => {
-                        html += `<tr>
-                            <td>${result.name}</td>
-                            <td>${result.email}</td>
-                            <td>${result.last_contact_date || 'no contact found'}</td>
-                            <td>${result.summary || 'no summary available'}</td>
-                            <td>${result.services_used || 'none identified'}</td>
-                            <td>${result.next_action || 'none suggested'}</td>
-                        </tr>`;
-                    });
-
-                    html += '</table>';
-                    document.getElementById('results').innerHTML = html;
-                    document.getElementById('results').style.display = 'block';
-                } catch (error) {
-                    showStatus('failed to load results: ' + error.message, 'error');
-                }
-            }
-
-            async function exportResults() {
-                if (!currentJobId) return;
-
-                const link = document.createElement('a');
-                link.href = `/export/${currentJobId}`;
-                link.download = 'contact_summaries.csv';
-                link.click();
-            }
-        </script>
-    </body>
-    </html>
-    """
+    # static page, browsers may reuse it for a few minutes
+    return FileResponse(INDEX_PATH, media_type="text/html", headers={"Cache-Control": HOME_CACHE_CONTROL})
 
 
 @app.post("/upload")
@@ -170,140 +65,324 @@ async def upload_csv(background_tasks: BackgroundTasks, file: UploadFile = File(
     # generate job id
     job_id = str(uuid.uuid4())
 
-    # save uploaded file
-    file_path = f"uploads/{job_id}.csv"
+    # validated contacts are saved as feather for the background task
+    file_path = f"uploads/{job_id}.feather"
     os.makedirs("uploads", exist_ok=True)
 
     try:
-        # read and validate csv
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
-
-        # parse csv to validate structure
-        df = pd.read_csv(file_path)
-        required_columns = ['name', 'email']
-
-        # check for required columns (case insensitive)
-        df.columns = df.columns.str.lower().str.strip()
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        # parse straight from starlette's spooled upload file, never holding the whole csv in memory
+        upload = file.file
+
+        # an identical csv reuses the earlier job instead of redoing every ai call
+        # only finished jobs, a run that died midway would otherwise stay stuck for every re-upload
+        # hashing and reading the header block both run in a thread so the event loop stays free
+        digest, header = await asyncio.to_thread(scan_upload, upload)
+        cached_job_id = await job_store.find_upload(digest)
+        if cached_job_id:
+            cached_job = await job_store.get_job(cached_job_id)
+            if cached_job and cached_job.get("status") == "complete":
+                return {"job_id": cached_job_id, "message": "identical upload, reusing results",
+                        "total_contacts": cached_job.get("total")}
+
+        # check for required columns (case insensitive), remembering each one's name in the file
+        source_columns = {}
+        for col in header:
+            source_columns.setdefault(col.strip().lower(), col)
+        missing_columns = [col for col in REQUIRED_COLUMNS if col not in source_columns]
 
         if missing_columns:
             raise HTTPException(
                 status_code=400,
-                detail=f"csv must contain columns: {', '.join(required_columns)}. missing: {', '.join(missing_columns)}"
+                detail=f"csv must contain columns: {', '.join(REQUIRED_COLUMNS)}. missing: {', '.join(missing_columns)}"
+            )
+
+        # parse only the contact columns, block by block on arrow's threads, and persist them once
+        contact_columns = [source_columns[col] for col in REQUIRED_COLUMNS]
+        reader = pv.open_csv(
+            upload,
+            read_options=pv.ReadOptions(use_threads=True),
+            convert_options=pv.ConvertOptions(
+                include_columns=contact_columns,
+                column_types={col: pa.string() for col in contact_columns},
+                strings_can_be_null=True
             )
+        )
+        # parsing and writing run in a thread so the event loop stays free
+        total = await asyncio.to_thread(write_contacts, reader, file_path)
 
         # initialize job
-        jobs[job_id] = {
+        await job_store.create_job(job_id, {
             "status": "processing",
             "progress": 0,
-            "total": len(df),
-            "started_at": datetime.now().isoformat()
-        }
+            "total": total,
+            "started_at": time.time()
+        })
+        await job_store.remember_upload(digest, job_id)
 
-        # start background processing
-        background_tasks.add_task(process_contacts, job_id, file_path)
+        # start background processing, in a celery worker when one is configured
+        if CELERY_ENABLED:
+            try:
+                # workers may not share this host's disk, the parsed contacts go through redis
+                await job_store.set_contacts(job_id, await asyncio.to_thread(pop_file, file_path))
+                # publishing blocks (and retries) while the broker is unreachable, keep it off the event loop
+                await asyncio.to_thread(process_contacts_task.delay, job_id)
+            except Exception as e:
+                # no worker will pick the job up, it must not stay at processing
+                await job_store.update_job(job_id, status="error", error=f"could not queue job: {e}")
+                await job_store.delete_contacts(job_id)
+                raise
+        else:
+            background_tasks.add_task(process_contacts, job_id, file_path, job_store)
 
-        return {"job_id": job_id, "message": "processing started", "total_contacts": len(df)}
+        return {"job_id": job_id, "message": "processing started", "total_contacts": total}
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"error processing csv: {str(e)}")
 
 
 @app.get("/status/{job_id}")
-async def get_status(job_id: str):
-    if job_id not in jobs:
+async def get_status(job_id: str, request: Request):
+    job = await job_store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+
+    # pollers get an empty 304 until something they can see changes
+    etag = f'W/"{job.get("progress")}-{job.get("status")}-{job.get("stage")}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return ORJSONResponse(format_job(job), headers=headers)
+
+
+@app.get("/events/{job_id}")
+async def job_events(job_id: str):
+    if await job_store.get_job(job_id) is None:
         raise HTTPException(status_code=404, detail="job not found")
 
-    return jobs[job_id]
+    async def event_stream():
+        # push every job update over one connection, stop once the job is done
+        async for job in job_store.subscribe(job_id):
+            if job is None:
+                break
+            yield f"data: {orjson.dumps(format_job(job)).decode()}\n\n"
+            if job.get("status") != "processing":
+                break
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @app.get("/results/{job_id}")
 async def get_results(job_id: str):
-    if job_id not in results:
+    results_json = await job_store.get_results_json(job_id)
+    if results_json is None:
         raise HTTPException(status_code=404, detail="results not found")
 
-    return {"results": results[job_id]}
+    # results are already serialized, wrap them without parsing
+    if isinstance(results_json, str):
+        results_json = results_json.encode()
+    return Response(content=b'{"results":' + results_json + b'}', media_type="application/json")
 
 
 @app.get("/export/{job_id}")
 async def export_results(job_id: str):
-    if job_id not in results:
+    job_results = await job_store.get_results(job_id)
+    if job_results is None:
         raise HTTPException(status_code=404, detail="results not found")
 
-    # convert results to dataframe and return as csv
-    df = pd.DataFrame(results[job_id])
-    csv_content = df.to_csv(index=False)
-
-    return Response(
-        content=csv_content,
+    # stream rows out as csv instead of building the whole file in memory
+    return StreamingResponse(
+        iter_results_csv(job_results),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename=contact_summaries_{job_id}.csv"}
     )
 
 
-async def process_contacts(job_id: str, file_path: str):
-    """background task to process contacts with ai"""
+def format_job(job: Dict) -> Dict:
+    """job state as returned by the api, timestamps formatted on read"""
+    for field in JOB_TIME_FIELDS:
+        if job.get(field) is not None:
+            job[field] = datetime.fromtimestamp(job[field]).isoformat()
+
+    return job
+
+
+def scan_upload(upload) -> Tuple[str, List[str]]:
+    """blake2b content digest and header column names of an uploaded file, rewinds it afterwards"""
+    digest = hashlib.blake2b(digest_size=16)
+    for block in iter(lambda: upload.read(UPLOAD_BLOCK_SIZE), b''):
+        digest.update(block)
+
+    # only the first block is read to validate structure
+    upload.seek(0)
+    header = pv.open_csv(upload).schema.names
+
+    upload.seek(0)
+    return digest.hexdigest(), header
+
+
+def write_contacts(batches: Iterator[pa.RecordBatch], file_path: str) -> int:
+    """write csv record batches to a feather file in CONTACT_CHUNK_SIZE batches, returns the row count"""
+    # a malformed row can fail the parse midway, only a fully parsed file takes the final name
+    tmp_path = f"{file_path}.tmp"
+    total = 0
     try:
-        df = pd.read_csv(file_path)
-        df.columns = df.columns.str.lower().str.strip()
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, CONTACT_SCHEMA) as writer:
+            for batch in batches:
+                # columns come in name, email order, only the file's spelling of them differs
+                table = pa.Table.from_batches([pa.RecordBatch.from_arrays(batch.columns, schema=CONTACT_SCHEMA)])
+                writer.write_table(table, max_chunksize=CONTACT_CHUNK_SIZE)
+                total += batch.num_rows
 
-        contact_results = []
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-        for index, row in df.iterrows():
-            try:
-                name = str(row.get('name', 'unknown'))
-                email = str(row.get('email', 'unknown@email.com'))
+    return total
 
-                # generate dummy email conversations
-                conversations = ai_processor.generate_dummy_email_data(email, name)
 
-                # get ai summary
-                summary_data = ai_processor.summarize_conversations(conversations, name, email)
+def pop_file(file_path: str) -> bytes:
+    """read a file and delete it"""
+    with open(file_path, 'rb') as f:
+        data = f.read()
 
-                # create result record
-                result = {
-                    "name": name,
-                    "email": email,
-                    "last_contact_date": summary_data.get('last_contact_date'),
-                    "summary": summary_data.get('summary'),
-                    "services_used": summary_data.get('services_used'),
-                    "next_action": summary_data.get('next_action')
-                }
+    os.remove(file_path)
+    return data
 
-                contact_results.append(result)
 
-                # update progress
-                jobs[job_id]["progress"] = index + 1
+def iter_contact_chunks(file_path: str) -> Iterator[Iterator[Tuple[str, str]]]:
+    """yield (name, email) pairs of a feather file one record batch at a time"""
+    with pa.memory_map(file_path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            # column by column, no dict is built per row
+            yield zip(batch.column('name').to_pylist(), batch.column('email').to_pylist())
 
-                # small delay to simulate processing time
-                import asyncio
-                await asyncio.sleep(0.5)
 
-            except Exception as e:
-                print(f"error processing contact {row.get('name', 'unknown')}: {e}")
-                # add error result for this contact
-                contact_results.append({
-                    "name": row.get('name', 'unknown'),
-                    "email": row.get('email', 'unknown'),
-                    "last_contact_date": None,
-                    "summary": f"error processing: {str(e)}",
-                    "services_used": None,
-                    "next_action": "manual review required"
-                })
+def iter_results_csv(rows: List[Dict]) -> Iterator[str]:
+    """yield result rows as csv text in blocks of about EXPORT_FLUSH_CHARS"""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=list(rows[0].keys()) if rows else RESULT_FIELDS, lineterminator='\n')
+    writer.writeheader()
+
+    for row in rows:
+        writer.writerow(row)
+        # one response chunk per block, not per row, keeps asgi send overhead down
+        if buf.tell() >= EXPORT_FLUSH_CHARS:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+
+    yield buf.getvalue()
+
+
+async def fetch_conversations(name: str, email: str) -> List[Dict]:
+    """fetch conversation history for a single contact"""
+    # generate dummy email conversations
+    conversations = ai_processor.generate_dummy_email_data(email, name)
+
+    # small delay to simulate processing time
+    await asyncio.sleep(0.5)
+
+    return conversations
+
+
+def build_result(name: str, email: str, summary_data: Dict) -> Dict:
+    """create result record for a summarized contact"""
+    return {
+        "name": name,
+        "email": email,
+        "last_contact_date": summary_data.get('last_contact_date'),
+        "summary": summary_data.get('summary'),
+        "services_used": summary_data.get('services_used'),
+        "next_action": summary_data.get('next_action')
+    }
+
+
+def build_error_result(name: str, email: str, error: Exception) -> Dict:
+    """create result record for a contact that failed to process"""
+    return {
+        "name": name,
+        "email": email,
+        "last_contact_date": None,
+        "summary": f"error processing: {str(error)}",
+        "services_used": None,
+        "next_action": "manual review required"
+    }
+
+
+async def fetch_chunk(job_id: str, contacts: List[tuple], sem: asyncio.Semaphore, store) -> List:
+    """fetch conversations for one chunk of (name, email) contacts, failures come back as their exception"""
+
+    async def fetch_one(name: str, email: str) -> List[Dict]:
+        async with sem:
+            try:
+                return await fetch_conversations(name, email)
+            finally:
+                # update progress, failed contacts count as done too
+                await store.increment_progress(job_id)
+
+    # a failing contact comes back as its exception instead of cancelling the chunk
+    return await asyncio.gather(*[fetch_one(name, email) for name, email in contacts], return_exceptions=True)
+
+
+async def process_contacts(job_id: str, file_path: str, store):
+    """
+    background task to process contacts with ai
+    store is the job store of the calling event loop, celery tasks each bring their own
+    """
+    try:
+        # conversations are pulled concurrently, the semaphore keeps gmail calls under rate limits
+        sem = asyncio.Semaphore(MAX_CONCURRENT_CONTACTS)
+
+        contacts = []
+        fetched = []
+
+        # columns were validated and normalized on upload, fetched one record batch at a time
+        await store.update_job(job_id, stage="fetching")
+        for records in iter_contact_chunks(file_path):
+            chunk = [(str(name or 'unknown'), str(email or 'unknown@email.com')) for name, email in records]
+            contacts.extend(chunk)
+            fetched.extend(await fetch_chunk(job_id, chunk, sem, store))
+
+        # every contact of the upload goes into a single gemini batch job
+        await store.update_job(job_id, stage="summarizing")
+        to_summarize = [
+            (name, email, conversations)
+            for (name, email), conversations in zip(contacts, fetched)
+            if not isinstance(conversations, Exception)
+        ]
+        summaries = iter(await asyncio.to_thread(ai_processor.summarize_many, to_summarize))
+
+        contact_results = [None] * len(contacts)
+        for index, ((name, email), conversations) in enumerate(zip(contacts, fetched)):
+            if isinstance(conversations, Exception):
+                print(f"error processing contact {name}: {conversations}")
+                contact_results[index] = build_error_result(name, email, conversations)
+            else:
+                contact_results[index] = build_result(name, email, next(summaries))
 
         # store results and mark complete
-        results[job_id] = contact_results
-        jobs[job_id]["status"] = "complete"
-        jobs[job_id]["completed_at"] = datetime.now().isoformat()
+        await store.set_results(job_id, contact_results)
+        await store.update_job(job_id, status="complete", completed_at=time.time())
 
     except Exception as e:
         print(f"processing error for job {job_id}: {e}")
-        jobs[job_id]["status"] = "error"
-        jobs[job_id]["error"] = str(e)
+        await store.update_job(job_id, status="error", error=str(e))
+
+    finally:
+        # results live in the job store, the parsed upload is no longer needed
+        if os.path.exists(file_path):
+            os.remove(file_path)
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    # in-memory job state is per process, so extra workers only when redis is shared between them
+    workers = os.cpu_count() if os.getenv('REDIS_URL') else 1
+
+    # uvloop and httptools are picked up when installed (uvicorn[standard]), plain asyncio otherwise
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers, loop="auto", http="auto")
@@ -0,0 +1,52 @@
+# 541
+
+# imports
+import asyncio, os
+from celery import Celery
+from dotenv import load_dotenv
+from job_store import create_job_store
+
+load_dotenv()
+
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
+
+# jobs go to celery workers only when a broker is configured and job state is shared through redis
+CELERY_ENABLED = bool(CELERY_BROKER_URL and os.getenv('REDIS_URL'))
+if CELERY_BROKER_URL and not CELERY_ENABLED:
+    print("warning: CELERY_BROKER_URL needs REDIS_URL for shared job state, processing uploads in the api")
+
+celery_app = Celery('contact_automation', broker=CELERY_BROKER_URL)
+
+
+@celery_app.task(ignore_result=True)
+def process_contacts_task(job_id: str):
+    """
+    run contact processing in a celery worker instead of the api process
+    not retried, process_contacts records its own failures on the job
+    """
+    asyncio.run(_process_contacts(job_id))
+
+
+async def _process_contacts(job_id: str):
+    # imported here, main imports this module at startup
+    from main import process_contacts
+
+    # redis connections and their pool locks are bound to the loop that first uses them,
+    # each asyncio.run gets a new loop and so a store of its own
+    job_store = create_job_store(os.getenv('REDIS_URL'))
+    try:
+        # the api may run on another host, contacts come through the job store
+        data = await job_store.get_contacts(job_id)
+        if data is None:
+            await job_store.update_job(job_id, status="error", error="uploaded contacts expired")
+            return
+
+        file_path = f"uploads/{job_id}.feather"
+        os.makedirs("uploads", exist_ok=True)
+        with open(file_path, 'wb') as f:
+            f.write(data)
+
+        await process_contacts(job_id, file_path, job_store)
+    finally:
+        await job_store.delete_contacts(job_id)
+        await job_store.close()
@@ -0,0 +1,76 @@
+# 541
+
+# imports
+import asyncio, threading, uuid
+import pyarrow as pa
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def redis_url(monkeypatch, tmp_path):
+    # a real socket server, so redis-py's connection pool and its locks are exercised
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"redis://127.0.0.1:{server.server_address[1]}/0"
+    monkeypatch.setenv("REDIS_URL", url)
+    # the task writes the handed over contacts to uploads/
+    monkeypatch.chdir(tmp_path)
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def make_job(redis_url: str, total: int) -> str:
+    """create a processing job with its contacts in redis, like /upload does"""
+    import main
+    from job_store import create_job_store
+
+    job_id = str(uuid.uuid4())
+    table = pa.table({"name": [f"contact {i}" for i in range(total)],
+                      "email": [f"contact{i}@example.com" for i in range(total)]}, schema=main.CONTACT_SCHEMA)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, main.CONTACT_SCHEMA) as writer:
+        writer.write_table(table)
+
+    async def create():
+        store = create_job_store(redis_url)
+        await store.create_job(job_id, {"status": "processing", "progress": 0, "total": total})
+        await store.set_contacts(job_id, sink.getvalue().to_pybytes())
+        await store.close()
+
+    asyncio.run(create())
+    return job_id
+
+
+def read_job(redis_url: str, job_id: str):
+    from job_store import create_job_store
+
+    async def read():
+        store = create_job_store(redis_url)
+        try:
+            return await store.get_job(job_id), await store.get_results(job_id)
+        finally:
+            await store.close()
+
+    return asyncio.run(read())
+
+
+def test_consecutive_tasks_in_one_process(redis_url, monkeypatch):
+    import main, tasks
+    from ai_processor import AIProcessor
+
+    # rule-based summaries, no gemini calls
+    monkeypatch.setattr(main, "ai_processor", AIProcessor())
+
+    # more contacts than MAX_CONCURRENT_CONTACTS, so progress updates contend for pooled connections
+    total = main.MAX_CONCURRENT_CONTACTS + 2
+    for _ in range(2):
+        job_id = make_job(redis_url, total)
+        tasks.process_contacts_task(job_id)
+
+        job, results = read_job(redis_url, job_id)
+        assert job["status"] == "complete"
+        assert job["progress"] == total
+        assert not [row for row in results if row["summary"].startswith("error processing")]